@@ -1,15 +1,25 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field, validator
-from typing import List, Optional, Literal
+from pydantic import BaseModel
+from typing import Annotated, List, Optional, Literal, Tuple
 from enum import Enum
-import heapq
+from collections import deque
+from itertools import count, islice
 from threading import Lock
-from dataclasses import dataclass, field
 import time
+import msgspec
+
+from matcher import OrderStore, PriceLevels, match_limit, match_market
 
 app = FastAPI(title="Prediction Market Exchange")
 
+# Oldest trades are dropped once the in-memory history reaches this size
+MAX_TRADE_HISTORY = 1_000_000
+# Quantities are stored and summed per level in int64 arrays; this cap keeps
+# every level total far below 2**63
+MAX_ORDER_QUANTITY = 2**31 - 1
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -26,33 +36,50 @@ class OrderType(str, Enum):
     BUY = "BUY"
     SELL = "SELL"
 
-class OrderRequest(BaseModel):
-    side: Side
-    type: OrderType
-    price: int = Field(ge=0, le=100)
-    quantity: int = Field(ge=1)
+class OrderRequest(msgspec.Struct, frozen=True):
+    side: Literal["YES", "NO"]
+    type: Literal["BUY", "SELL"]
+    price: Annotated[int, msgspec.Meta(ge=0, le=100)]
+    quantity: Annotated[int, msgspec.Meta(ge=1, le=MAX_ORDER_QUANTITY)]
     account_id: str
 
-    @validator('price')
-    def validate_price(cls, v, values):
-        if 'type' in values:
-            if values['type'] == OrderType.SELL and v > 100:
-                raise ValueError('SELL price cannot exceed 100')
-            if values['type'] == OrderType.BUY and v < 0:
-                raise ValueError('BUY price cannot be negative')
-        return v
-
-@dataclass(order=True)
-class Order:
-    priority: tuple = field(compare=True)
-    order_id: int = field(compare=False)
-    account_id: str = field(compare=False)
-    side: str = field(compare=False)
-    order_type: str = field(compare=False)
-    price: int = field(compare=False)
-    original_price: int = field(compare=False)
-    quantity: int = field(compare=False)
-    timestamp: float = field(compare=False)
+# Lax like pydantic: "50" and 50.0 coerce to 50; bounds are still enforced
+order_request_decoder = msgspec.json.Decoder(OrderRequest, strict=False)
+json_encoder = msgspec.json.Encoder()
+
+# msgspec types are invisible to FastAPI, so publish the request schema by hand
+_, _order_request_components = msgspec.json.schema_components([OrderRequest])
+ORDER_REQUEST_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {"application/json": {"schema": _order_request_components["OrderRequest"]}},
+    }
+}
+
+class TradeRec(msgspec.Struct):
+    """
+    Engine-side trade record. /trades encodes these directly with msgspec;
+    they are converted to Trade only for the /orders response.
+    """
+    trade_id: int
+    maker_order_id: int
+    taker_order_id: int
+    price: int
+    quantity: int
+    side: str
+    timestamp: int
+
+    def to_model(self) -> "Trade":
+        # Fields are engine-generated; skip validation (FastAPI validates the response)
+        return Trade.model_construct(
+            trade_id=self.trade_id,
+            maker_order_id=self.maker_order_id,
+            taker_order_id=self.taker_order_id,
+            price=self.price,
+            quantity=self.quantity,
+            side=self.side,
+            timestamp=self.timestamp
+        )
 
 class Trade(BaseModel):
     trade_id: int
@@ -61,7 +88,7 @@ class Trade(BaseModel):
     price: int
     quantity: int
     side: str
-    timestamp: float
+    timestamp: int  # nanoseconds since the epoch
 
 class OrderBookResponse(BaseModel):
     yes_bids: List[dict]
@@ -77,241 +104,199 @@ class OrderResponse(BaseModel):
     trades: List[Trade]
     message: str
 
-class OrderBook:
+class OutcomeBook:
+    """Bid and ask books for one outcome (YES or NO), guarded by their own lock"""
     def __init__(self):
-        self.yes_bids = []
-        self.yes_asks = []
-        self.no_bids = []
-        self.no_asks = []
-
-        self.next_order_id = 1
-        self.next_trade_id = 1
+        self.bids = PriceLevels(is_bid=True)
+        self.asks = PriceLevels(is_bid=False)
         self.lock = Lock()
-        self.all_trades = []
+        self.store = OrderStore()
+        # order_id -> store slot, for resting orders only
         self.orders_by_id = {}
+        # Bumped by every placement on this outcome; keys the cached order book JSON
+        self.version = 0
 
-    def _normalize_order(self, order_req: OrderRequest):
-        """
-        Normalize orders to canonical form for matching.
-        SELL YES at P becomes BUY NO at (100-P)
-        SELL NO at P becomes BUY YES at (100-P)
-        Returns: (canonical_side, is_buy, canonical_price)
-        """
-        if order_req.type == OrderType.SELL:
-            if order_req.side == Side.YES:
-                return ("NO", True, 100 - order_req.price)
-            else:
-                return ("YES", True, 100 - order_req.price)
-        else:
-            return (order_req.side.value, True, order_req.price)
+class OrderBook:
+    def __init__(self):
+        # YES and NO orders never match each other, so each outcome's book
+        # has its own lock and placements on different outcomes run in parallel
+        self.yes = OutcomeBook()
+        self.no = OutcomeBook()
+
+        # next() on itertools.count is atomic, so ids need no shared lock
+        self.order_ids = count(1)
+        self.trade_ids = count(1)
+        self.trades_lock = Lock()
+        self.all_trades = deque(maxlen=MAX_TRADE_HISTORY)
+
+        # account_id -> small int, so the match loop compares ints, not strings
+        self.account_ids = {}
+        self.account_ids_lock = Lock()
+
+        # (versions, etag, body) of the last serialized order book; replaced
+        # as a whole so readers never see a torn entry. The epoch keeps ETags
+        # from a reset book distinct from the old one's.
+        self.epoch = time.time_ns()
+        self._cached_order_book = None
+
+    def _add_to_book(self, outcome: OutcomeBook, book: PriceLevels, slot: int):
+        """Append order to the tail of its price level (time priority)"""
+        book.add(outcome.store, slot)
+
+    def _intern_account(self, account_id: str) -> int:
+        aid = self.account_ids.get(account_id)
+        if aid is None:
+            # Placements on both outcomes may intern new accounts at once
+            with self.account_ids_lock:
+                aid = self.account_ids.setdefault(account_id, len(self.account_ids))
+        return aid
+
+    def _get_outcome_book(self, order_req: OrderRequest) -> OutcomeBook:
+        return self.yes if order_req.side == Side.YES else self.no
+
+    def _get_matching_book(self, outcome: OutcomeBook, order_req: OrderRequest) -> PriceLevels:
+        # Incoming BUY matches resting asks, incoming SELL matches resting bids
+        return outcome.asks if order_req.type == OrderType.BUY else outcome.bids
+
+    def _get_resting_book(self, outcome: OutcomeBook, order_req: OrderRequest) -> PriceLevels:
+        return outcome.bids if order_req.type == OrderType.BUY else outcome.asks
+
+    def _execute_trade(self, store: OrderStore, maker_slot: int, taker_order_id: int,
+                       side: str, quantity: int, timestamp: int) -> TradeRec:
+        """Record a fill of a resting order by the taker"""
+        trade_price = store.price[maker_slot]
+
+        return TradeRec(
+            next(self.trade_ids),
+            store.order_id[maker_slot],
+            taker_order_id,
+            trade_price,
+            quantity,
+            side,
+            timestamp
+        )
 
-    def _add_to_book(self, book: list, order: Order, is_bid: bool):
-        """Add order to the appropriate book with correct priority"""
-        if is_bid:
-            priority = (-order.price, order.timestamp, order.order_id)
-        else:
-            priority = (order.price, order.timestamp, order.order_id)
-        
-        order.priority = priority
-        heapq.heappush(book, order)
-
-    def _get_matching_book(self, canonical_side: str):
-        # Incoming BUY matches against resting BUYs
-        if canonical_side == "YES":
-            return self.yes_bids
+    def place_order(self, order_req: OrderRequest, verbose: bool = False) -> OrderResponse:
+        """Place and match an order; the human-readable message is only built if verbose"""
+        outcome = self._get_outcome_book(order_req)
+        with outcome.lock:
+            return self._place_order(outcome, order_req, verbose)
+
+    def _place_order(self, outcome: OutcomeBook, order_req: OrderRequest,
+                     verbose: bool) -> OrderResponse:
+        """Match order_req against its outcome's book; caller holds outcome.lock"""
+        # Checked before anything is matched, so a rejected order changes nothing.
+        # Structs built in code skip the decoder's bounds, and the store columns
+        # are fixed-width.
+        if not 0 <= order_req.price <= 100:
+            raise ValueError(f"price must be between 0 and 100, got {order_req.price}")
+        if not 1 <= order_req.quantity <= MAX_ORDER_QUANTITY:
+            raise ValueError(
+                f"quantity must be between 1 and {MAX_ORDER_QUANTITY}, got {order_req.quantity}"
+            )
+
+        now = time.time_ns()
+        order_id = next(self.order_ids)
+
+        is_market = (order_req.type == OrderType.BUY and order_req.price == 100) or \
+                   (order_req.type == OrderType.SELL and order_req.price == 0)
+
+        account = self._intern_account(order_req.account_id)
+        store = outcome.store
+        matching_book = self._get_matching_book(outcome, order_req)
+        fills = []
+        if is_market:
+            remaining_qty = match_market(
+                matching_book, store, account, order_req.quantity, fills
+            )
         else:
-            return self.no_bids
+            remaining_qty = match_limit(
+                matching_book,
+                store,
+                account,
+                order_req.type == OrderType.BUY,
+                order_req.price,
+                order_req.quantity,
+                fills
+            )
 
-    def _get_resting_book(self, canonical_side: str):
-        # Rest unmatched BUY orders into bids
-        if canonical_side == "YES":
-            return self.yes_bids
+        trades = []
+        for i in range(0, len(fills), 2):
+            maker_slot = fills[i]
+            trades.append(self._execute_trade(
+                store, maker_slot, order_id, order_req.side, fills[i + 1], now
+            ))
+            if store.qty[maker_slot] == 0:
+                del outcome.orders_by_id[store.order_id[maker_slot]]
+                store.release(maker_slot)
+
+        if remaining_qty > 0:
+            slot = store.alloc(order_id, account, order_req.price, remaining_qty)
+            resting_book = self._get_resting_book(outcome, order_req)
+            self._add_to_book(outcome, resting_book, slot)
+
+            outcome.orders_by_id[order_id] = slot
+            status = "PARTIALLY_FILLED" if trades else "OPEN"
         else:
-            return self.no_bids
-
-    def _can_match(self, taker_price: int, maker_price: int, taker_account: str, maker_account: str) -> bool:
-        """Check if taker can match with maker"""
-        if taker_account == maker_account:
-            return False
-        return taker_price >= maker_price
-
-    def _execute_trade(self, taker: Order, maker: Order, quantity: int) -> Trade:
-        """Execute a trade between two orders"""
-        trade_price = maker.original_price
-
-        trade = Trade(
-            trade_id=self.next_trade_id,
-            maker_order_id=maker.order_id,
-            taker_order_id=taker.order_id,
-            price=trade_price,
-            quantity=quantity,
-            side=taker.side,
-            timestamp=time.time()
-        )
+            status = "FILLED"
 
-        self.next_trade_id += 1
-        self.all_trades.append(trade)
-        return trade
-
-    def place_order(self, order_req: OrderRequest) -> OrderResponse:
-        """Place and match an order"""
-        with self.lock:
-            order_id = self.next_order_id
-            self.next_order_id += 1
-
-            is_market = (order_req.type == OrderType.BUY and order_req.price == 100) or \
-                       (order_req.type == OrderType.SELL and order_req.price == 0)
-
-            canonical_side, is_buy, canonical_price = self._normalize_order(order_req)
-
-            order = Order(
-                priority=(0, 0, 0),
-                order_id=order_id,
-                account_id=order_req.account_id,
-                side=order_req.side.value,
-                order_type=order_req.type.value,
-                price=canonical_price,
-                original_price=order_req.price,
-                quantity=order_req.quantity,
-                timestamp=time.time()
-            )
+        outcome.version += 1
 
-            trades = []
-            remaining_qty = order.quantity
-            matching_book = self._get_matching_book(canonical_side)
-            skipped_orders = []
-
-            while remaining_qty > 0 and matching_book:
-                if not matching_book:
-                    break
-
-                best_maker = matching_book[0]
-
-                if order.account_id == best_maker.account_id:
-                    heapq.heappop(matching_book)
-                    skipped_orders.append(best_maker)
-                    continue
-
-                can_match = is_market or self._can_match(
-                    canonical_price,
-                    best_maker.price,
-                    order.account_id,
-                    best_maker.account_id
-                )
-
-                if can_match:
-                    heapq.heappop(matching_book)
-
-                    trade_qty = min(remaining_qty, best_maker.quantity)
-                    trade = self._execute_trade(order, best_maker, trade_qty)
-                    trades.append(trade)
-
-                    remaining_qty -= trade_qty
-                    best_maker.quantity -= trade_qty
-
-                    if best_maker.quantity > 0:
-                        heapq.heappush(matching_book, best_maker)
-                else:
-                    break
-
-            for skipped in skipped_orders:
-                heapq.heappush(matching_book, skipped)
-
-            if remaining_qty > 0:
-                order.quantity = remaining_qty
-                resting_book = self._get_resting_book(canonical_side)
-                self._add_to_book(resting_book, order, True)
-
-                self.orders_by_id[order_id] = order
-                status = "PARTIALLY_FILLED" if trades else "OPEN"
-            else:
-                status = "FILLED"
-
-            filled_qty = order_req.quantity - remaining_qty
-
-            return OrderResponse(
-                order_id=order_id,
-                status=status,
-                filled_quantity=filled_qty,
-                remaining_quantity=remaining_qty,
-                trades=trades,
-                message=f"Order {order_id}: {status}. Filled {filled_qty}/{order_req.quantity} shares in {len(trades)} trade(s)."
-            )
+        if trades:
+            with self.trades_lock:
+                self.all_trades.extend(trades)
 
-    def get_order_book(self) -> OrderBookResponse:
-        """Get current order book state with proper bid/ask separation"""
-        with self.lock:
-            yes_bids_display = []
-            yes_asks_display = []
-            no_bids_display = []
-            no_asks_display = []
-
-            # Process YES orders
-            for order in heapq.nsmallest(10, self.yes_bids):
-                order_dict = {
-                    "order_id": order.order_id,
-                    "price": order.original_price,
-                    "quantity": order.quantity,
-                    "account_id": order.account_id
-                }
-                
-                # Determine if this is a bid or ask based on original order type
-                if order.order_type == "BUY" and order.side == "YES":
-                    yes_bids_display.append(order_dict)
-                elif order.order_type == "SELL" and order.side == "NO":
-                    # SELL NO at X becomes BUY YES at (100-X), show as YES bid
-                    yes_bids_display.append(order_dict)
-
-            # Process NO orders  
-            for order in heapq.nsmallest(10, self.no_bids):
-                order_dict = {
-                    "order_id": order.order_id,
-                    "price": order.original_price,
-                    "quantity": order.quantity,
-                    "account_id": order.account_id
-                }
-                
-                # Determine if this is a bid or ask based on original order type
-                if order.order_type == "BUY" and order.side == "NO":
-                    no_bids_display.append(order_dict)
-                elif order.order_type == "SELL" and order.side == "YES":
-                    # SELL YES at X becomes BUY NO at (100-X), show as NO bid
-                    no_bids_display.append(order_dict)
-
-            # For asks, we need to derive them from the opposite side
-            # YES asks = offers to sell YES = same as buying NO
-            # So we look at NO bids with original SELL YES orders
-            for order in heapq.nsmallest(10, self.no_bids):
-                if order.order_type == "SELL" and order.side == "YES":
-                    yes_asks_display.append({
-                        "order_id": order.order_id,
-                        "price": order.original_price,
-                        "quantity": order.quantity,
-                        "account_id": order.account_id
-                    })
-
-            # NO asks = offers to sell NO = same as buying YES  
-            # So we look at YES bids with original SELL NO orders
-            for order in heapq.nsmallest(10, self.yes_bids):
-                if order.order_type == "SELL" and order.side == "NO":
-                    no_asks_display.append({
-                        "order_id": order.order_id,
-                        "price": order.original_price,
-                        "quantity": order.quantity,
-                        "account_id": order.account_id
-                    })
-
-            return OrderBookResponse(
-                yes_bids=yes_bids_display,
-                yes_asks=yes_asks_display,
-                no_bids=no_bids_display,
-                no_asks=no_asks_display
-            )
+        filled_qty = order_req.quantity - remaining_qty
+
+        if verbose:
+            message = f"Order {order_id}: {status}. Filled {filled_qty}/{order_req.quantity} shares in {len(trades)} trade(s)."
+        else:
+            message = ""
+
+        return OrderResponse.model_construct(
+            order_id=order_id,
+            status=status,
+            filled_quantity=filled_qty,
+            remaining_quantity=remaining_qty,
+            trades=[trade.to_model() for trade in trades],
+            message=message
+        )
 
-    def get_recent_trades(self, limit: int = 20) -> List[Trade]:
+    def _top_levels(self) -> dict:
+        """Top 10 price levels of each side of the book, keyed like OrderBookResponse"""
+        # Each outcome is locked only for its own O(10) level walk
+        with self.yes.lock:
+            yes_bids = self.yes.bids.top(10)
+            yes_asks = self.yes.asks.top(10)
+        with self.no.lock:
+            no_bids = self.no.bids.top(10)
+            no_asks = self.no.asks.top(10)
+
+        return {
+            "yes_bids": yes_bids,
+            "yes_asks": yes_asks,
+            "no_bids": no_bids,
+            "no_asks": no_asks
+        }
+
+    def get_order_book_json(self) -> Tuple[str, bytes]:
+        """ETag and JSON body of the top levels, re-serialized only after the book changes"""
+        # Versions are read before the snapshot, so a racing placement can only
+        # make the body newer than its label, which forces a refresh next call
+        versions = (self.yes.version, self.no.version)
+        cached = self._cached_order_book
+        if cached is not None and cached[0] == versions:
+            return cached[1], cached[2]
+
+        etag = f'"{self.epoch}-{versions[0]}-{versions[1]}"'
+        body = json_encoder.encode(self._top_levels())
+        self._cached_order_book = (versions, etag, body)
+        return etag, body
+
+    def get_recent_trades(self, limit: int = 20) -> List[TradeRec]:
         """Get recent trades"""
-        with self.lock:
-            return self.all_trades[-limit:][::-1]
+        with self.trades_lock:
+            return list(islice(reversed(self.all_trades), limit))
 
 order_book = OrderBook()
 
@@ -319,23 +304,33 @@ order_book = OrderBook()
 def read_root():
     return {"message": "Prediction Market Exchange API", "status": "running"}
 
-@app.post("/orders", response_model=OrderResponse)
-def place_order(order: OrderRequest):
-    """Place a new order"""
+@app.post("/orders", response_model=OrderResponse, openapi_extra=ORDER_REQUEST_OPENAPI)
+async def place_order(request: Request, verbose: bool = False):
+    """Place a new order; pass ?verbose=1 for a human-readable message"""
+    try:
+        order = order_request_decoder.decode(await request.body())
+    except msgspec.DecodeError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
     try:
-        return order_book.place_order(order)
+        # Decoding stays on the event loop; matching blocks on a lock, so run it in a thread
+        return await run_in_threadpool(order_book.place_order, order, verbose)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.get("/orderbook", response_model=OrderBookResponse)
-def get_order_book():
-    """Get current order book"""
-    return order_book.get_order_book()
+def get_order_book(request: Request):
+    """Get current order book; answers 304 if the client's ETag is still current"""
+    etag, body = order_book.get_order_book_json()
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    return Response(content=body, media_type="application/json", headers={"ETag": etag})
 
 @app.get("/trades", response_model=List[Trade])
-def get_trades(limit: int = 20):
+def get_trades(limit: int = Query(20, ge=0, le=MAX_TRADE_HISTORY)):
     """Get recent trades"""
-    return order_book.get_recent_trades(limit)
+    body = json_encoder.encode(order_book.get_recent_trades(limit))
+    return Response(content=body, media_type="application/json")
 
 @app.post("/reset")
 def reset_order_book():
@@ -346,4 +341,6 @@ def reset_order_book():
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+
+    # Single process: the book lives in memory, so every worker would get its own
+    uvicorn.run(app, host="0.0.0.0", port=8000)
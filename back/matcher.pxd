@@ -0,0 +1,49 @@
+# Static types for compiling matcher.py with Cython (augmenting .pxd)
+cimport cython
+from cpython cimport array
+
+
+cdef class OrderStore:
+    cdef public array.array order_id
+    cdef public array.array price
+    cdef public array.array qty
+    cdef public array.array account
+    cdef public list free
+
+    @cython.locals(slot=Py_ssize_t)
+    cpdef Py_ssize_t alloc(self, long long order_id, long long account, long price, long long quantity)
+    cpdef release(self, Py_ssize_t slot)
+
+
+cdef class PriceLevels:
+    cdef public bint is_bid
+    cdef public list levels
+    cdef public array.array qty
+    cdef public list accounts
+    cdef public object mask
+
+    cpdef long best_price(self, object prices)
+
+    @cython.locals(price=long, account=cython.longlong, accounts=dict)
+    cpdef add(self, OrderStore store, Py_ssize_t slot)
+
+
+@cython.locals(remaining=long)
+cdef _release(dict accounts, long long account)
+
+
+cpdef long long match_market(PriceLevels book, OrderStore store, long long taker_account,
+                             long long quantity, list fills)
+
+
+@cython.locals(crossing=object)
+cpdef long long match_limit(PriceLevels book, OrderStore store, long long taker_account,
+                            bint is_buy, long taker_price, long long quantity, list fills)
+
+
+@cython.locals(levels=list, level_qty=array.array, level_accounts=list,
+               order_qty=array.array, order_account=array.array,
+               price=long, level=object, accounts=dict, i=Py_ssize_t,
+               slot=Py_ssize_t, fill_qty=cython.longlong)
+cdef long long _walk(PriceLevels book, OrderStore store, long long taker_account,
+                     object prices, long long quantity, list fills)
@@ -0,0 +1,182 @@
+# cython: language_level=3, boundscheck=False, wraparound=False, annotation_typing=False
+"""
+Price-level book and the inner match loop.
+
+Runs as plain Python. For speed it can be compiled in place with
+`cythonize -i matcher.py`, which applies the static types declared in
+matcher.pxd (OrderStore and PriceLevels become cdef classes, loop
+counters and prices become C integers).
+"""
+from array import array
+from collections import deque
+from typing import List
+
+# BIT[P] is the mask bit for price P (prices exceed 63, so no C-int shifts)
+BIT = tuple(1 << price for price in range(101))
+ALL_PRICES = (1 << 101) - 1
+# Prices a limit order at P can trade against: asks <= P for a BUY, bids >= P for a SELL
+CROSSING_ASKS = tuple((BIT[price] << 1) - 1 for price in range(101))
+CROSSING_BIDS = tuple(ALL_PRICES & ~(BIT[price] - 1) for price in range(101))
+
+
+class OrderStore:
+    """
+    Resting orders in struct-of-arrays form. An order is an integer slot;
+    its fields live at that index in parallel arrays, so the match loop
+    touches only the quantity and account of each maker. Slots of filled
+    orders go on a free list and are reused.
+    """
+    def __init__(self):
+        self.order_id = array('q')
+        self.price = array('h')
+        self.qty = array('q')
+        self.account = array('q')
+        self.free = []
+
+    def alloc(self, order_id: int, account: int, price: int, quantity: int) -> int:
+        if not self.free:
+            self.order_id.append(order_id)
+            self.price.append(price)
+            self.qty.append(quantity)
+            self.account.append(account)
+            return len(self.qty) - 1
+        slot = self.free.pop()
+        self.order_id[slot] = order_id
+        self.price[slot] = price
+        self.qty[slot] = quantity
+        self.account[slot] = account
+        return slot
+
+    def release(self, slot: int):
+        self.free.append(slot)
+
+
+class PriceLevels:
+    """
+    One side of the book (bids or asks): a FIFO queue of order slots per
+    price 0..100, the aggregate resting quantity per price, and a bitmask
+    of non-empty levels. Bit P of `mask` is set while levels[P] holds
+    orders, so the best bid is mask.bit_length() - 1 and the best ask is
+    the lowest set bit. accounts[P] counts resting orders per account at
+    price P, which lets the match loop skip self-trade checks at levels
+    the taker is not in.
+    """
+    def __init__(self, is_bid: bool):
+        self.is_bid = is_bid
+        self.levels = [deque() for _ in range(101)]
+        self.qty = array('q', [0] * 101)
+        self.accounts = [{} for _ in range(101)]
+        self.mask = 0
+
+    def best_price(self, prices: int) -> int:
+        """Best price among the set bits of `prices`"""
+        if self.is_bid:
+            return prices.bit_length() - 1
+        return (prices & -prices).bit_length() - 1
+
+    def add(self, store: OrderStore, slot: int):
+        price = store.price[slot]
+        account = store.account[slot]
+        accounts = self.accounts[price]
+        # The fixed-width level total is the only step that can fail (overflow),
+        # so it goes first and a failed add leaves the level untouched
+        self.qty[price] += store.qty[slot]
+        self.levels[price].append(slot)
+        accounts[account] = accounts.get(account, 0) + 1
+        self.mask |= BIT[price]
+
+    def top(self, n: int = 10) -> List[dict]:
+        """Best n price levels, best first (highest bid / lowest ask)"""
+        result = []
+        prices = self.mask
+        while prices and len(result) < n:
+            price = self.best_price(prices)
+            result.append({"price": price, "quantity": self.qty[price]})
+            prices &= ~BIT[price]
+        return result
+
+
+def _release(accounts: dict, account: int):
+    """Drop one resting order of `account` from a level's account counts"""
+    remaining = accounts[account] - 1
+    if remaining:
+        accounts[account] = remaining
+    else:
+        del accounts[account]
+
+
+def match_market(book: PriceLevels, store: OrderStore, taker_account: int,
+                 quantity: int, fills: list) -> int:
+    """Match a market order: every occupied level of `book` is eligible"""
+    return _walk(book, store, taker_account, book.mask, quantity, fills)
+
+
+def match_limit(book: PriceLevels, store: OrderStore, taker_account: int, is_buy: bool,
+                taker_price: int, quantity: int, fills: list) -> int:
+    """Match a limit order: only levels priced through `taker_price` are eligible"""
+    crossing = CROSSING_ASKS[taker_price] if is_buy else CROSSING_BIDS[taker_price]
+    return _walk(book, store, taker_account, book.mask & crossing, quantity, fills)
+
+
+def _walk(book: PriceLevels, store: OrderStore, taker_account: int, prices: int,
+          quantity: int, fills: list) -> int:
+    """
+    Fill up to `quantity` against the levels of `book` whose bits are set
+    in `prices`, best first, in price-time priority and skipping the
+    taker's own orders (accounts are interned integer ids). Callers mask
+    `prices` down to crossing levels, so the loop has no price check.
+    Each fill is appended to `fills` as a flat `maker_slot, fill_qty`
+    pair; fully filled makers are removed from the book (their slots are
+    left for the caller to release). Returns the unfilled quantity.
+    """
+    levels = book.levels
+    level_qty = book.qty
+    level_accounts = book.accounts
+    order_qty = store.qty
+    order_account = store.account
+
+    while quantity > 0 and prices:
+        price = book.best_price(prices)
+        level = levels[price]
+        accounts = level_accounts[price]
+
+        if taker_account not in accounts:
+            # Fast path: none of the taker's orders rest here, fill from the head
+            while quantity > 0 and level:
+                slot = level[0]
+                fill_qty = min(quantity, order_qty[slot])
+                quantity -= fill_qty
+                order_qty[slot] -= fill_qty
+                level_qty[price] -= fill_qty
+                fills.append(slot)
+                fills.append(fill_qty)
+
+                if order_qty[slot] == 0:
+                    level.popleft()
+                    _release(accounts, order_account[slot])
+        else:
+            i = 0
+            while quantity > 0 and i < len(level):
+                slot = level[i]
+
+                # Self-trade prevention: leave own orders in place
+                if order_account[slot] == taker_account:
+                    i += 1
+                    continue
+
+                fill_qty = min(quantity, order_qty[slot])
+                quantity -= fill_qty
+                order_qty[slot] -= fill_qty
+                level_qty[price] -= fill_qty
+                fills.append(slot)
+                fills.append(fill_qty)
+
+                if order_qty[slot] == 0:
+                    del level[i]
+                    _release(accounts, order_account[slot])
+
+        if not level:
+            book.mask &= ~BIT[price]
+        prices &= ~BIT[price]
+
+    return quantity
@@ -0,0 +1,60 @@
+"""
+Tests for the order book engine and HTTP API in main.py.
+"""
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from main import MAX_ORDER_QUANTITY
+
+
+@pytest.fixture
+def client():
+    client = TestClient(main.app)
+    client.post("/reset")
+    return client
+
+
+def order(**fields):
+    body = {"side": "YES", "type": "BUY", "price": 50, "quantity": 1, "account_id": "alice"}
+    body.update(fields)
+    return body
+
+
+@pytest.mark.parametrize("price", [50, 50.0, "50"])
+def test_lax_price_accepted(client, price):
+    resp = client.post("/orders", json=order(price=price))
+    assert resp.status_code == 200
+    assert client.get("/orderbook").json()["yes_bids"] == [{"price": 50, "quantity": 1}]
+
+
+@pytest.mark.parametrize("fields", [
+    {"price": -1}, {"price": 101}, {"price": 50.5}, {"quantity": 0},
+    {"quantity": MAX_ORDER_QUANTITY + 1}, {"quantity": 10**19}, {"side": "MAYBE"},
+])
+def test_invalid_order_rejected(client, fields):
+    assert client.post("/orders", json=order(**fields)).status_code == 422
+
+
+def test_oversized_order_leaves_book_unchanged(client):
+    client.post("/orders", json=order(type="SELL", price=40, quantity=5, account_id="bob"))
+    resp = client.post("/orders", json=order(price=50, quantity=10**19))
+    assert resp.status_code == 422
+    assert client.get("/orderbook").json()["yes_asks"] == [{"price": 40, "quantity": 5}]
+    assert client.get("/trades").json() == []
+
+
+@pytest.mark.parametrize("fields", [{"quantity": 10**19}, {"quantity": 0}, {"price": -1}])
+def test_engine_rejects_before_matching(fields):
+    book = main.OrderBook()
+    maker = book.place_order(main.OrderRequest(**order(type="SELL", price=40, quantity=5,
+                                                        account_id="bob")))
+    with pytest.raises(ValueError):
+        book.place_order(main.OrderRequest(**order(**fields)))
+
+    assert book.yes.asks.top() == [{"price": 40, "quantity": 5}]
+    assert maker.order_id in book.yes.orders_by_id
+    assert list(book.get_recent_trades(10)) == []
+    # No ids were used up by the rejected order
+    assert next(book.order_ids) == 2
+    assert next(book.trade_ids) == 1
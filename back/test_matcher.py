@@ -0,0 +1,194 @@
+"""
+Tests for the price-level book and match loop in matcher.py.
+
+They run against whichever `matcher` module is importable: the pure
+Python source, or the extension built by `cythonize -i matcher.py`.
+test_compiled_matches_pure_python compares the two builds and is skipped
+when no compiled module is present.
+"""
+import importlib.util
+import random
+from pathlib import Path
+
+import pytest
+
+import matcher
+from matcher import (CROSSING_ASKS, CROSSING_BIDS, OrderStore, PriceLevels,
+                     match_limit, match_market)
+
+
+def rest(book, store, order_id, account, price, quantity):
+    """Put an order straight onto `book` and return its slot"""
+    slot = store.alloc(order_id, account, price, quantity)
+    book.add(store, slot)
+    return slot
+
+
+def filled(store, fills):
+    """(maker order_id, fill quantity) pairs from a flat fills list"""
+    return [(store.order_id[fills[i]], fills[i + 1]) for i in range(0, len(fills), 2)]
+
+
+def test_best_price_first():
+    store, asks = OrderStore(), PriceLevels(is_bid=False)
+    rest(asks, store, 1, 0, 55, 5)
+    rest(asks, store, 2, 0, 52, 5)
+    rest(asks, store, 3, 0, 58, 5)
+
+    fills = []
+    assert match_market(asks, store, 1, 12, fills) == 0
+    assert filled(store, fills) == [(2, 5), (1, 5), (3, 2)]
+    assert asks.top() == [{"price": 58, "quantity": 3}]
+
+
+def test_bids_best_first():
+    store, bids = OrderStore(), PriceLevels(is_bid=True)
+    rest(bids, store, 1, 0, 40, 1)
+    rest(bids, store, 2, 0, 70, 1)
+    rest(bids, store, 3, 0, 64, 1)
+
+    assert [level["price"] for level in bids.top()] == [70, 64, 40]
+    fills = []
+    match_market(bids, store, 1, 2, fills)
+    assert filled(store, fills) == [(2, 1), (3, 1)]
+
+
+def test_time_priority_within_level():
+    store, asks = OrderStore(), PriceLevels(is_bid=False)
+    for order_id in (1, 2, 3):
+        rest(asks, store, order_id, order_id, 50, 4)
+
+    fills = []
+    assert match_limit(asks, store, 9, True, 50, 6, fills) == 0
+    assert filled(store, fills) == [(1, 4), (2, 2)]
+
+
+def test_partial_fill_leaves_maker_resting():
+    store, asks = OrderStore(), PriceLevels(is_bid=False)
+    slot = rest(asks, store, 1, 0, 50, 10)
+
+    fills = []
+    assert match_limit(asks, store, 1, True, 50, 3, fills) == 0
+    assert store.qty[slot] == 7
+    assert list(asks.levels[50]) == [slot]
+    assert asks.top() == [{"price": 50, "quantity": 7}]
+
+
+def test_unfilled_quantity_returned():
+    store, asks = OrderStore(), PriceLevels(is_bid=False)
+    rest(asks, store, 1, 0, 50, 4)
+
+    fills = []
+    assert match_market(asks, store, 1, 10, fills) == 6
+    assert asks.mask == 0
+    assert asks.top() == []
+
+
+def test_self_trade_skipped():
+    store, asks = OrderStore(), PriceLevels(is_bid=False)
+    own = rest(asks, store, 1, 7, 50, 5)
+    rest(asks, store, 2, 3, 50, 2)
+    rest(asks, store, 3, 7, 51, 5)
+    rest(asks, store, 4, 3, 52, 2)
+
+    fills = []
+    assert match_market(asks, store, 7, 10, fills) == 6
+    assert filled(store, fills) == [(2, 2), (4, 2)]
+    # The taker's own orders keep their place and quantity
+    assert list(asks.levels[50]) == [own]
+    assert asks.top() == [{"price": 50, "quantity": 5}, {"price": 51, "quantity": 5}]
+    assert asks.accounts[50] == {7: 1}
+
+
+def test_limit_stops_at_crossing_price():
+    store, asks = OrderStore(), PriceLevels(is_bid=False)
+    rest(asks, store, 1, 0, 50, 5)
+    rest(asks, store, 2, 0, 51, 5)
+
+    fills = []
+    assert match_limit(asks, store, 1, True, 50, 8, fills) == 3
+    assert filled(store, fills) == [(1, 5)]
+
+    store, bids = OrderStore(), PriceLevels(is_bid=True)
+    rest(bids, store, 1, 0, 50, 5)
+    rest(bids, store, 2, 0, 49, 5)
+
+    fills = []
+    assert match_limit(bids, store, 1, False, 50, 8, fills) == 3
+    assert filled(store, fills) == [(1, 5)]
+
+
+def test_crossing_masks():
+    for price in range(101):
+        assert CROSSING_ASKS[price] == sum(1 << p for p in range(price + 1))
+        assert CROSSING_BIDS[price] == sum(1 << p for p in range(price, 101))
+
+
+def test_filled_levels_cleared():
+    store, asks = OrderStore(), PriceLevels(is_bid=False)
+    rest(asks, store, 1, 0, 100, 1)
+    rest(asks, store, 2, 0, 0, 1)
+
+    fills = []
+    assert match_market(asks, store, 1, 2, fills) == 0
+    assert asks.mask == 0
+    assert all(not level for level in asks.levels)
+    assert all(not accounts for accounts in asks.accounts)
+
+
+def test_add_is_all_or_nothing():
+    store, bids = OrderStore(), PriceLevels(is_bid=True)
+    first = rest(bids, store, 1, 0, 50, 2**62)
+    with pytest.raises(OverflowError):
+        rest(bids, store, 2, 1, 50, 2**62)
+
+    # The rejected order is neither queued nor counted, so it cannot be filled
+    assert list(bids.levels[50]) == [first]
+    assert bids.accounts[50] == {0: 1}
+    assert bids.qty[50] == 2**62
+    fills = []
+    assert match_market(bids, store, 1, 3, fills) == 0
+    assert filled(store, fills) == [(1, 3)]
+
+
+def _random_stream(mod, seed):
+    """Replay a random order stream through `mod` and log fills and book state"""
+    rnd = random.Random(seed)
+    store = mod.OrderStore()
+    books = {True: mod.PriceLevels(is_bid=True), False: mod.PriceLevels(is_bid=False)}
+    log = []
+    for order_id in range(2000):
+        is_buy = rnd.random() < 0.5
+        price = rnd.choice([0, 100] + list(range(40, 61)))
+        quantity = rnd.randint(1, 20)
+        account = rnd.randrange(4)
+        fills = []
+        if (is_buy and price == 100) or (not is_buy and price == 0):
+            remaining = mod.match_market(books[not is_buy], store, account, quantity, fills)
+        else:
+            remaining = mod.match_limit(books[not is_buy], store, account, is_buy,
+                                        price, quantity, fills)
+        for i in range(0, len(fills), 2):
+            slot = fills[i]
+            log.append((store.order_id[slot], fills[i + 1]))
+            if store.qty[slot] == 0:
+                store.release(slot)
+        if remaining:
+            books[is_buy].add(store, store.alloc(order_id, account, price, remaining))
+        log.append(remaining)
+    log.append([(book.mask, list(book.qty)) for book in books.values()])
+    return log
+
+
+def test_compiled_matches_pure_python():
+    if matcher.__file__.endswith(".py"):
+        pytest.skip("matcher is not compiled")
+
+    spec = importlib.util.spec_from_file_location(
+        "matcher_py", Path(__file__).with_name("matcher.py")
+    )
+    pure = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(pure)
+
+    for seed in range(20):
+        assert _random_stream(matcher, seed) == _random_stream(pure, seed), seed
@@ -57,7 +57,7 @@ function App() {
     setMessage("");
 
     try {
-      const response = await fetch(`${API_BASE}/orders`, {
+      const response = await fetch(`${API_BASE}/orders?verbose=1`, {
         method: "POST",
         headers: {
           "Content-Type": "application/json",
@@ -112,15 +112,13 @@ function App() {
               <tr>
                 <th>Price</th>
                 <th>Quantity</th>
-                <th>Account</th>
               </tr>
             </thead>
             <tbody>
-              {orders.map((order) => (
-                <tr key={order.order_id} className={side}>
-                  <td className="price">{order.price}¢</td>
-                  <td>{order.quantity}</td>
-                  <td className="account">{order.account_id}</td>
+              {orders.map((level) => (
+                <tr key={level.price} className={side}>
+                  <td className="price">{level.price}¢</td>
+                  <td>{level.quantity}</td>
                 </tr>
               ))}
             </tbody>